@@ -0,0 +1,172 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.stats import rankdata
+
+from places import safe_distance
+
+# ==========================================
+# 응답자 부트스트랩으로 순위 안정성 추정
+# ==========================================
+# 세그먼트마다 응답자를 복원추출(B 회)해 득표수 → 거리 → 순위를 다시 계산한다.
+# 재표본은 다항분포 가중치 행렬 W (B × 응답자) 한 번으로 뽑고,
+# 득표수는 W @ R (R: 응답자 × 장소 희소 행렬) 행렬곱으로 구하므로 재표본별 파이썬 루프가 없다.
+# 배치(batch_size × 장소 수)마다 득표수·순위를 (장소, 값, 횟수) 희소 히스토그램으로 줄여 누적하므로
+# 전체 B × 장소 수 배열도, 장소 수 × 장소 수 순위 표도 만들지 않는다.
+# 메모리는 배치 작업분(batch_size × 장소 수) + 실제로 관측된 (장소, 득표수) · (장소, 순위) 조합 수에 비례한다.
+# 거리는 장소별 득표수의 단조 함수라 득표수 히스토그램에서 백분위를 그대로 복원한다.
+
+
+def respondent_matrix(picks: np.ndarray):
+    # 응답자 × (세그먼트에 등장한 장소) 득표 행렬, 열 → 전역 장소 ID
+    resp = np.repeat(np.arange(picks.shape[0]), picks.shape[1])
+    ids = picks.ravel()
+    ok = ids >= 0
+    place_ids, cols = np.unique(ids[ok], return_inverse=True)
+    data = np.ones(int(ok.sum()), dtype=np.float32)
+    r = sp.coo_matrix((data, (resp[ok], cols)), shape=(picks.shape[0], len(place_ids))).tocsr()
+    return r, place_ids
+
+
+def _rank(dist: np.ndarray) -> np.ndarray:
+    # 거리 오름차순, 동점은 공동 순위(min), 지도에 없는 장소(NaN)는 NaN
+    filled = np.where(np.isnan(dist), np.inf, dist)
+    ranks = rankdata(filled, method="min", axis=-1).astype(np.float32)
+    ranks[np.isnan(dist)] = np.nan
+    return ranks
+
+
+def _resample_chunk(r, volumes, n_samples: int, seed, count_width: int):
+    rng = np.random.default_rng(seed)
+    n = r.shape[0]
+    weights = rng.multinomial(n, np.full(n, 1.0 / n), size=n_samples).astype(np.float32)
+    counts = np.asarray((r.T @ weights.T).T, dtype=np.float32)
+    dist = safe_distance(volumes[None, :], counts).astype(np.float32)
+    dist[counts <= 0] = np.nan
+    ranks = _rank(dist)
+
+    # 배치 → (장소 × 폭 + 값) 코드별 횟수, 지도에 없는 재표본(순위 NaN)은 순위 히스토그램에서 제외
+    n_places = counts.shape[1]
+    place = np.arange(n_places, dtype=np.int64)
+    count_code = (place * count_width + counts.astype(np.int64)).ravel()
+    rank_code = (place * (n_places + 1) + np.nan_to_num(ranks, nan=-1).astype(np.int64)).ravel()
+    rank_code = rank_code[~np.isnan(ranks).ravel()]
+    return np.unique(count_code, return_counts=True), np.unique(rank_code, return_counts=True)
+
+
+def _add_hist(total, hist):
+    # 정렬된 (코드, 횟수) 두 개를 합침, 같은 코드는 횟수를 더함
+    if total is None:
+        return hist
+    code, count = np.concatenate((total[0], hist[0])), np.concatenate((total[1], hist[1]))
+    o = np.argsort(code, kind="stable")
+    code, count = code[o], count[o]
+    start = np.flatnonzero(np.r_[True, code[1:] != code[:-1]])
+    return code[start], np.add.reduceat(count, start)
+
+
+def _decode(hist, width: int):
+    code, count = hist
+    return code // width, code % width, count
+
+
+def bootstrap_segment(picks, volumes, n_samples: int = 2000, batch_size: int = 250, seed: int = 0, n_jobs: int = 1):
+    r, place_ids = respondent_matrix(picks)
+    vol = np.asarray(volumes, dtype=float)[place_ids]
+    if r.shape[0] == 0 or len(place_ids) == 0:
+        return place_ids, None
+
+    # 재표본 득표수 상한: 응답자 수 × 추천 칸 수
+    count_width = r.shape[0] * max(picks.shape[1], 1) + 1
+    # 배치마다 고정 시드 → n_jobs 와 무관하게 같은 결과
+    sizes = [min(batch_size, n_samples - i) for i in range(0, n_samples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    count_hist = rank_hist = None
+    if n_jobs > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            for ch, rh in pool.map(_resample_chunk, [r] * len(sizes), [vol] * len(sizes), sizes, seeds, [count_width] * len(sizes)):
+                count_hist, rank_hist = _add_hist(count_hist, ch), _add_hist(rank_hist, rh)
+    else:
+        for size, s in zip(sizes, seeds):
+            ch, rh = _resample_chunk(r, vol, size, s, count_width)
+            count_hist, rank_hist = _add_hist(count_hist, ch), _add_hist(rank_hist, rh)
+
+    observed_counts = np.asarray(r.sum(axis=0)).ravel()
+    observed_dist = safe_distance(vol, observed_counts)
+    return place_ids, {
+        "volumes": vol,
+        "observed_counts": observed_counts,
+        "observed_dist": observed_dist,
+        "observed_rank": _rank(observed_dist),
+        "count_hist": _decode(count_hist, count_width),
+        "rank_hist": _decode(rank_hist, len(place_ids) + 1),
+    }
+
+
+def _hist_percentile(place, value, count, n_places: int, q):
+    # 장소별로 값 오름차순 정렬된 희소 히스토그램에서 np.percentile(linear) 과 같은 값, 표본이 없으면 NaN
+    n = np.bincount(place, count, n_places)
+    if not len(value):
+        return np.full(n_places, np.nan)
+    cum = np.cumsum(count)
+    start = np.concatenate(([0], np.cumsum(n)[:-1]))
+    pos = q / 100 * np.maximum(n - 1, 0)
+    lo = np.floor(pos)
+    hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+    last = len(value) - 1
+    v_lo = value[np.minimum(np.searchsorted(cum, start + lo, side="right"), last)]
+    v_hi = value[np.minimum(np.searchsorted(cum, start + hi, side="right"), last)]
+    out = v_lo + (pos - lo) * (v_hi - v_lo)
+    return np.where(n > 0, out, np.nan)
+
+
+def summarize(samples, ci: float = 0.95) -> pd.DataFrame:
+    lo, hi = 100 * (1 - ci) / 2, 100 * (1 + ci) / 2
+    observed_rank = samples["observed_rank"]
+    n_places = len(observed_rank)
+    c_place, c, c_n = samples["count_hist"]
+    r_place, rank, r_n = samples["rank_hist"]
+    n_samples = np.bincount(c_place, c_n, n_places)
+
+    def share(mask, place, n):
+        return np.bincount(place[mask], n[mask], n_places) / n_samples
+
+    # 거리는 득표수가 많을수록 작아지므로 득표수 내림차순 = 거리 오름차순 (득표 0 = 지도에 없음 제외)
+    dist = safe_distance(samples["volumes"][c_place], c)
+    ok = (c > 0) & ~np.isnan(dist)
+    o = np.lexsort((-c[ok], c_place[ok]))
+    d_hist = (c_place[ok][o], dist[ok][o], c_n[ok][o])
+
+    return pd.DataFrame({
+        "votes": samples["observed_counts"],
+        "votes_mean": np.bincount(c_place, c * c_n, n_places) / n_samples,
+        "votes_ci_low": _hist_percentile(c_place, c, c_n, n_places, lo),
+        "votes_ci_high": _hist_percentile(c_place, c, c_n, n_places, hi),
+        "distance": samples["observed_dist"],
+        "distance_ci_low": _hist_percentile(*d_hist, n_places, lo),
+        "distance_ci_high": _hist_percentile(*d_hist, n_places, hi),
+        "rank": observed_rank,
+        "rank_median": _hist_percentile(r_place, rank, r_n, n_places, 50),
+        "rank_ci_low": _hist_percentile(r_place, rank, r_n, n_places, lo),
+        "rank_ci_high": _hist_percentile(r_place, rank, r_n, n_places, hi),
+        "p_present": 1 - share(c == 0, c_place, c_n),
+        "p_same_rank": share(rank == observed_rank[r_place], r_place, r_n),
+        "p_top1": share(rank <= 1, r_place, r_n),
+        "p_top2": share(rank <= 2, r_place, r_n),
+        "p_top3": share(rank <= 3, r_place, r_n),
+    })
+
+
+def bootstrap_rank_stability(table, volumes, segments, n_samples: int = 2000, batch_size: int = 250, ci: float = 0.95, seed: int = 0, n_jobs: int = 1) -> pd.DataFrame:
+    frames = []
+    for s, seg in enumerate(segments):
+        place_ids, samples = bootstrap_segment(seg["picks"], volumes, n_samples, batch_size, seed + s, n_jobs)
+        if samples is None:
+            continue
+        df = summarize(samples, ci)
+        df.insert(0, "place", [table.names[i] for i in place_ids])
+        df.insert(0, "segment", seg["cfg"]["key"])
+        frames.append(df.sort_values(["rank", "votes"], ascending=[True, False], na_position="last"))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
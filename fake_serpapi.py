@@ -0,0 +1,248 @@
+import argparse
+import csv
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ==========================================
+# 🧪 로컬 SerpApi 대역 서버 (부하 테스트 / CI 용)
+# ==========================================
+# 사용 예:
+#   python fake_serpapi.py --port 8765 --latency exponential --latency-ms 80 --rate-limit-rate 0.05
+#   SERPAPI_BACKEND=http://127.0.0.1:8765 python main.py
+
+LATENCY_MODELS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+def stable_total_results(query: str) -> int:
+    # 쿼리마다 항상 같은 값 (10^3 ~ 10^9 로그 균등)
+    h = hashlib.md5(query.encode("utf-8")).hexdigest()
+    u = int(h[:8], 16) / 0xFFFFFFFF
+    return int(10 ** (3 + 6 * u))
+
+
+def load_volumes_csv(path: str) -> dict:
+    volumes = {}
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                volumes[row["place"]] = int(float(row["search_volume"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return volumes
+
+
+class FakeSerpApi:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: str = "fixed",
+        latency_ms: float = 20.0,
+        latency_sigma: float = 0.5,
+        rate_limit_rate: float = 0.0,
+        max_qps: float = 0.0,
+        timeout_rate: float = 0.0,
+        hang_s: float = 10.0,
+        malformed_rate: float = 0.0,
+        volumes: dict = None,
+        seed: int = 0,
+    ):
+        if latency not in LATENCY_MODELS:
+            raise ValueError(f"latency must be one of {LATENCY_MODELS}, got {latency!r}")
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.rate_limit_rate = rate_limit_rate
+        self.max_qps = max_qps
+        self.timeout_rate = timeout_rate
+        self.hang_s = hang_s
+        self.malformed_rate = malformed_rate
+        self.volumes = volumes or {}
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # 버킷 크기는 최소 1 토큰 (max_qps < 1 이어도 1/max_qps 초마다 한 요청은 통과)
+        self._capacity = max(1.0, max_qps)
+        self._tokens = self._capacity
+        self._last_refill = time.monotonic()
+        self._server = None
+        self._thread = None
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "timeouts": 0, "malformed": 0}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _sample_latency(self) -> float:
+        mean = self.latency_ms / 1000.0
+        if mean <= 0:
+            return 0.0
+        with self._lock:
+            if self.latency == "uniform":
+                return self._rng.uniform(0.0, 2 * mean)
+            if self.latency == "exponential":
+                return self._rng.expovariate(1.0 / mean)
+            if self.latency == "lognormal":
+                # 평균이 latency_ms 가 되도록 mu 보정
+                mu = math.log(mean) - self.latency_sigma ** 2 / 2
+                return self._rng.lognormvariate(mu, self.latency_sigma)
+            return mean
+
+    def _take_token(self) -> bool:
+        # max_qps > 0 이면 토큰 버킷으로 초과 요청을 429 처리
+        if self.max_qps <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self.max_qps)
+            self._last_refill = now
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+    def _decide(self) -> str:
+        if not self._take_token():
+            return "rate_limited"
+        with self._lock:
+            u = self._rng.random()
+        for outcome, rate in (
+            ("rate_limited", self.rate_limit_rate),
+            ("timeouts", self.timeout_rate),
+            ("malformed", self.malformed_rate),
+        ):
+            if u < rate:
+                return outcome
+            u -= rate
+        return "ok"
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats[outcome] += 1
+
+    def _payload(self, query: str, params: dict) -> dict:
+        total = self.volumes.get(query)
+        if total is None:
+            total = stable_total_results(query)
+        return {
+            "search_metadata": {"status": "Success"},
+            "search_parameters": {k: v for k, v in params.items() if k != "api_key"},
+            "search_information": {"query_displayed": query, "total_results": total},
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes):
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                if parsed.path not in ("/search", "/search.json"):
+                    self._send(404, b'{"error": "Not found"}')
+                    return
+
+                outcome = server._decide()
+                server._count(outcome)
+                time.sleep(server._sample_latency())
+
+                if outcome == "rate_limited":
+                    self._send(429, b'{"error": "Your account has run out of searches."}')
+                    return
+                if outcome == "timeouts":
+                    # 클라이언트 타임아웃보다 길게 잡아 두고 응답
+                    time.sleep(server.hang_s)
+                    self._send(504, b'{"error": "Timed out."}')
+                    return
+
+                body = json.dumps(server._payload(params.get("q", ""), params)).encode("utf-8")
+                if outcome == "malformed":
+                    body = body[: max(1, len(body) // 2)]
+                self._send(200, body)
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in SerpApi server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", choices=LATENCY_MODELS, default="fixed")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="mean latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal sigma")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--max-qps", type=float, default=0.0, help="token-bucket limit (0 = off)")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of hanging requests")
+    parser.add_argument("--hang-s", type=float, default=10.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of truncated bodies")
+    parser.add_argument("--volumes", help="place_volumes.csv to serve instead of hashed values")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeSerpApi(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        rate_limit_rate=args.rate_limit_rate,
+        max_qps=args.max_qps,
+        timeout_rate=args.timeout_rate,
+        hang_s=args.hang_s,
+        malformed_rate=args.malformed_rate,
+        volumes=load_volumes_csv(args.volumes) if args.volumes else None,
+        seed=args.seed,
+    )
+    fake.start()
+    print(f"🧪 Fake SerpApi 실행 중: {fake.url}  (SERPAPI_BACKEND={fake.url})")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\n📊 {fake.stats}")
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 import pandas as pd
-from serpapi import GoogleSearch
 import time
 
-API_KEY = "api key"
+from serp_fetch import FETCH_DELAY, QUERY_PARAMS, fetch_total_results
+from volume_history import VolumeHistory, config_key
 
 def get_search_volume():
 
@@ -23,31 +23,20 @@ def get_search_volume():
 
     print(f"🔍 총 {len(places)}개의 장소를 찾았습니다. 검색량 수집을 시작합니다.")
 
-    results_data = []
+    results_data, fetched = [], []
 
     for place in places:
         print(f"📡 '{place}' 검색 중...")
         
-        # SerpApi로 구글 검색 결과 수 가져오기
-        params = {
-            "q": place,
-            "location": "Global",
-            "hl": "en",
-            "gl": "us",
-            "api_key": API_KEY
-        }
-        
+        # SerpApi로 구글 검색 결과 수 가져오기 (재시도 포함)
         try:
-            search = GoogleSearch(params)
-            results = search.get_dict()
-            
-            # 'total_results'가 검색 결과 개수입니다.
-            total_count = results.get("search_information", {}).get("total_results", 0)
+            total_count = fetch_total_results(place)
             
             results_data.append({
                 "place": place,
                 "search_volume": total_count
             })
+            fetched.append(results_data[-1])
             print(f"   ✅ 결과: {total_count}개")
             
         except Exception as e:
@@ -55,11 +44,14 @@ def get_search_volume():
             results_data.append({"place": place, "search_volume": 0})
         
         # API 부하를 줄이기 위해 아주 잠깐 쉽니다.
-        time.sleep(0.5)
+        time.sleep(FETCH_DELAY)
 
     # 3. 결과를 엑셀(CSV)로 저장
     volume_df = pd.DataFrame(results_data)
     volume_df.to_csv('place_volumes.csv', index=False, encoding='utf-8-sig')
+    # 검색량 이력에도 스냅샷 추가 (실패로 0 을 채운 값은 제외)
+    if fetched:
+        VolumeHistory('volume_history').append(pd.DataFrame(fetched), config_key(QUERY_PARAMS))
     print("\n🎉 모든 검색량 수집 완료! 'place_volumes.csv' 파일을 확인하세요.")
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+# ==========================================
+# Trend-KNN: 심리적 거리 공간의 최근접 이웃 인덱스
+# ==========================================
+# 행 = (세그먼트, 장소), 특징 = [거리, 득표수, log10(검색량)] 을 표준화한 값.
+# 세그먼트마다 KD-tree 를 하나씩 두고, 파이프라인 실행마다 한 번 만들어 .npz 로 저장한다.
+#
+#   index = TrendIndex.load("trend_knn_index.npz")
+#   index.query("gangnam", "seoul_female", k=5)
+
+FEATURES = ("distance", "votes", "log_volume")
+
+
+class TrendIndex:
+    def __init__(self, names, segment_keys, row_segment, row_place, features, mean, std):
+        self.names = np.asarray(names, dtype=str)
+        self.segment_keys = [str(k) for k in segment_keys]
+        self.row_segment = np.asarray(row_segment, dtype=np.int64)
+        self.row_place = np.asarray(row_place, dtype=np.int64)
+        self.features = np.asarray(features, dtype=float)
+        self.mean = np.asarray(mean, dtype=float)
+        self.std = np.asarray(std, dtype=float)
+
+        self._ids = {name: i for i, name in enumerate(self.names)}
+        self._trees, self._rows, self._row_of = {}, {}, {}
+        points = self._scale(self.features)
+        for s, key in enumerate(self.segment_keys):
+            rows = np.flatnonzero(self.row_segment == s)
+            self._rows[key] = rows
+            self._trees[key] = cKDTree(points[rows]) if len(rows) else None
+            self._row_of[key] = dict(zip(self.row_place[rows].tolist(), range(len(rows))))
+
+    @classmethod
+    def build(cls, table, volumes, segments):
+        row_segment, row_place, features = [], [], []
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_volume = np.log10(volumes)
+        for s, seg in enumerate(segments):
+            counts, dist = seg["counts"], seg["distances"]
+            ids = np.flatnonzero((counts > 0) & ~np.isnan(dist))
+            row_segment.append(np.full(len(ids), s))
+            row_place.append(ids)
+            features.append(np.column_stack((dist[ids], counts[ids], log_volume[ids])))
+
+        features = np.concatenate(features) if features else np.empty((0, len(FEATURES)))
+        mean = features.mean(axis=0) if len(features) else np.zeros(len(FEATURES))
+        std = features.std(axis=0) if len(features) else np.ones(len(FEATURES))
+        std[std == 0] = 1.0
+        return cls(
+            table.names,
+            [seg["cfg"]["key"] for seg in segments],
+            np.concatenate(row_segment) if row_segment else np.empty(0),
+            np.concatenate(row_place) if row_place else np.empty(0),
+            features, mean, std,
+        )
+
+    def _scale(self, features):
+        return (np.asarray(features, dtype=float) - self.mean) / self.std
+
+    def save(self, path: str):
+        np.savez_compressed(
+            path,
+            names=self.names,
+            segment_keys=np.asarray(self.segment_keys, dtype=str),
+            row_segment=self.row_segment,
+            row_place=self.row_place,
+            features=self.features,
+            mean=self.mean,
+            std=self.std,
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["names"], z["segment_keys"], z["row_segment"], z["row_place"], z["features"], z["mean"], z["std"])
+
+    def __len__(self):
+        return len(self.row_place)
+
+    def segment_size(self, segment: str) -> int:
+        return len(self._rows[segment])
+
+    def query_vectors(self, vectors, segment: str, k: int = 5):
+        # 원시 특징 벡터(distance, votes, log_volume) 로 질의 → (장소 이름, 표준화 거리)
+        tree = self._trees[segment]
+        vectors = np.atleast_2d(vectors)
+        k = min(k, self.segment_size(segment))
+        if tree is None or k <= 0:
+            return np.empty((len(vectors), 0), dtype=str), np.empty((len(vectors), 0))
+        dist, idx = tree.query(self._scale(vectors), k=k)
+        dist, idx = dist.reshape(len(vectors), k), idx.reshape(len(vectors), k)
+        return self.names[self.row_place[self._rows[segment][idx]]], dist
+
+    def query_batch(self, places, segment: str, k: int = 5):
+        # 각 장소와 가장 비슷한 k 개 (자기 자신 제외)
+        row_of = self._row_of[segment]
+        missing = [p for p in places if row_of.get(self._ids.get(p, -1)) is None]
+        if missing:
+            raise KeyError(f"'{segment}' 세그먼트에 없는 장소: {missing[:5]}")
+        local = np.array([row_of[self._ids[p]] for p in places], dtype=np.int64)
+        k = min(k, self.segment_size(segment) - 1)
+        if k <= 0:
+            return np.empty((len(local), 0), dtype=str), np.empty((len(local), 0))
+
+        rows = self._rows[segment]
+        dist, idx = self._trees[segment].query(self._scale(self.features[rows[local]]), k=k + 1)
+        dist, idx = dist.reshape(len(local), k + 1), idx.reshape(len(local), k + 1)
+        # 자기 자신을 빼고 앞에서부터 k 개 (동일 좌표 장소 때문에 자기 자신이 안 잡힐 수도 있음)
+        keep = idx != local[:, None]
+        keep &= np.cumsum(keep, axis=1) <= k
+        idx, dist = idx[keep].reshape(len(local), k), dist[keep].reshape(len(local), k)
+        return self.names[self.row_place[rows[idx]]], dist
+
+    def query(self, place: str, segment: str, k: int = 5):
+        names, dist = self.query_batch([place], segment, k)
+        return list(zip(names[0].tolist(), dist[0].tolist()))
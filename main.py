@@ -1,19 +1,27 @@
 import pandas as pd
 import numpy as np
+import argparse
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import hashlib
+import html
 import math
 import re
 import time
 import os
 import sys
 
+from bootstrap import bootstrap_rank_stability
+from knn_index import TrendIndex
+from volume_history import VolumeHistory, config_key
+from segment_matrix import build_place_segment_matrix, save_matrix, similarity_pairs
+from places import PlaceTable, aggregate_segments, first_appearance, safe_distance, volume_array
+
 # 라이브러리 체크
 try:
     from korean_romanizer.romanizer import Romanizer
     import pykakasi
-    from serpapi import GoogleSearch
+    from serp_fetch import FETCH_DELAY, QUERY_PARAMS, fetch_total_results
 except ImportError as e:
     print("❌ 필요 라이브러리가 설치되지 않았습니다.")
     print(f"   에러: {e}")
@@ -22,11 +30,29 @@ except ImportError as e:
 # ==========================================
 # ⚙️ 설정 (Configuration)
 # ==========================================
-SERPAPI_KEY = "api key"
 INPUT_FILE = 'survey.csv'
 CLEAN_FILE = 'clean.csv'
 VOLUME_FILE = 'place_volumes.csv'
 OUTPUT_HTML = 'index.html'
+HISTORY_DIR = 'volume_history'
+QUERY_CONFIG = config_key(QUERY_PARAMS)
+KNN_INDEX_FILE = 'trend_knn_index.npz'
+MATRIX_FILE = 'place_segment_matrix.npz'
+SIMILARITY_FILE = 'segment_similarity.csv'
+BOOTSTRAP_FILE = 'bootstrap_stability.csv'
+BOOTSTRAP_SAMPLES = int(os.environ.get("BOOTSTRAP_SAMPLES", "2000"))
+BOOTSTRAP_JOBS = int(os.environ.get("BOOTSTRAP_JOBS", "1"))  # >1 이면 배치를 여러 프로세스에서 계산
+LOD_MAX_POINTS = 40     # 서브플롯당 개별 마커 상한 (cfg["max_points"] 로 덮어쓰기, None = 전부 표시)
+LOD_RING_WIDTH = 3.0    # 롱테일 클러스터를 묶는 거리 대역 폭
+LOD_HOVER_LIMIT = 12
+LOD_CLUSTER_MAX_SIZE = 30.0  # 클러스터 마커 상한 (1표 장소 마커 크기와 같음)
+
+SEGMENT_CONFIGS = [
+    {"key": "seoul_male",   "title": "Seoul · Male",   "gender": "남성", "pairs": [(7, 8), (9, 10)], "row": 1, "col": 1, "color": "#1f77b4", "center_label": "SEOUL"},
+    {"key": "seoul_female", "title": "Seoul · Female", "gender": "여성", "pairs": [(7, 8), (9, 10)], "row": 1, "col": 2, "color": "#ff7f0e", "center_label": "SEOUL"},
+    {"key": "tokyo_male",   "title": "Tokyo · Male",   "gender": "남성", "pairs": [(3, 4), (5, 6)],  "row": 2, "col": 1, "color": "#2ca02c", "center_label": "TOKYO"},
+    {"key": "tokyo_female", "title": "Tokyo · Female", "gender": "여성", "pairs": [(3, 4), (5, 6)],  "row": 2, "col": 2, "color": "#d62728", "center_label": "TOKYO"},
+]
 
 japanese = pykakasi.kakasi()
 
@@ -44,7 +70,7 @@ def auto_convert(text):
     return converted.lower().replace(" ", "")
 
 def process_survey_data():
-    print("\n[1/3] 🧹 데이터 전처리 시작...")
+    print("\n[1/6] 🧹 데이터 전처리 시작...")
     if not os.path.exists(INPUT_FILE):
         print(f"❌ 오류: '{INPUT_FILE}' 파일이 없습니다.")
         sys.exit(1)
@@ -64,9 +90,16 @@ def process_survey_data():
 # [STEP 2] 검색량 수집
 # ==========================================
 def fetch_search_volumes():
-    print("\n[2/3] 🔍 구글 검색량 수집 시작...")
+    print("\n[2/6] 🔍 구글 검색량 수집 시작...")
+    history = VolumeHistory(HISTORY_DIR)
     if os.path.exists(VOLUME_FILE):
         print(f"   ℹ️ 기존 '{VOLUME_FILE}' 파일을 사용합니다.")
+        if not history.chunks:
+            # 이력이 비어 있으면 기존 스냅샷을 파일 수정 시각 기준으로 첫 기록으로 남김 (실패로 0 이 들어간 행은 제외)
+            snapshot = pd.read_csv(VOLUME_FILE)
+            snapshot = snapshot[pd.to_numeric(snapshot["search_volume"], errors="coerce") > 0]
+            rows = history.append(snapshot, QUERY_CONFIG, observed_at=int(os.path.getmtime(VOLUME_FILE)))
+            print(f"   ℹ️ '{HISTORY_DIR}' 이력에 {rows}건 기록.")
         return
 
     try:
@@ -80,154 +113,246 @@ def fetch_search_volumes():
         places = [p for p in all_places if pd.notna(p) and p != "" and not str(p).startswith('#')]
 
         print(f"   - 총 {len(places)}개 장소 검색 시작...")
-        results_data = []
+        results_data, fetched = [], []
 
+        start = time.time()
         for idx, place in enumerate(places):
             print(f"   - ({idx+1}/{len(places)}) '{place}'...", end=" ")
-            params = {"q": place, "location": "Global", "hl": "en", "gl": "us", "api_key": SERPAPI_KEY}
             try:
-                search = GoogleSearch(params)
-                results = search.get_dict()
-                total_count = results.get("search_information", {}).get("total_results", 0)
+                total_count = fetch_total_results(place)
                 results_data.append({"place": place, "search_volume": total_count})
+                fetched.append(results_data[-1])
                 print(f"{total_count:,}개")
             except Exception as e:
                 print(f"실패 ({e})")
                 results_data.append({"place": place, "search_volume": 0})
-            time.sleep(0.5)
+            time.sleep(FETCH_DELAY)
+        elapsed = max(time.time() - start, 1e-9)
 
         volume_df = pd.DataFrame(results_data)
         volume_df.to_csv(VOLUME_FILE, index=False, encoding='utf-8-sig')
-        print("   ✅ 수집 완료.")
+        # 실패(0 으로 채운 값)는 이력에 남기지 않음
+        if fetched: history.append(pd.DataFrame(fetched), QUERY_CONFIG)
+        print(f"   ✅ 수집 완료. ({len(places)}건, {elapsed:.2f}초, {len(places) / elapsed:.1f}건/초)")
     except Exception as e:
         print(f"❌ 검색량 오류: {e}")
 
 # ==========================================
-# [STEP 3] 인터랙티브 맵
+# 맵 레이아웃 헬퍼
 # ==========================================
 def _stable_angle(place: str) -> float:
     h = hashlib.md5(place.encode("utf-8")).hexdigest()
     u = int(h[:8], 16) / 0xFFFFFFFF
     return 2 * math.pi * u
 
-def _safe_distance(volume: float, count: int, k: float = 30.0, min_d: float = 2.0, max_d: float = 25.0):
-    if volume is None or pd.isna(volume): return None
-    try: v = float(volume)
-    except: return None
-    if v <= 1: return None 
-
-    denom = math.log10(v)
-    if denom <= 0: return None
-    base_distance = k / denom 
-
-    vote_bonus = (count - 1) * 1.5 
-    final_distance = base_distance - vote_bonus
-    return max(min_d, min(final_distance, max_d))
-
-def _compute_marker_size(count: int, base: float = 12.0, scale: float = 18.0, alpha: float = 0.90, max_size: float = 100.0):
-    if count <= 0: return base
-    s = base + scale * (count ** alpha)
-    return min(s, max_size)
-
-def _separate_points(x, y, sizes, iters=170, padding=2.25, repel_strength=0.065, pull_strength=0.02):
+def _compute_marker_size(count, base: float = 12.0, scale: float = 18.0, alpha: float = 0.90, max_size: float = 100.0):
+    c = np.asarray(count, dtype=float)
+    s = base + scale * np.maximum(c, 0) ** alpha
+    return np.where(c <= 0, base, np.minimum(s, max_size))
+
+def _marker_radius(sizes):
+    # 마커 크기(px)를 좌표계 반지름으로 바꾸는 경험적 스케일
+    return 0.10 + 0.012 * np.asarray(sizes, dtype=float)
+
+def _best_angle(rho, theta0, half_i, r, theta, half):
+    # 반지름 rho 에서 이웃 마커들이 막는 각도 구간(섹터)을 겹쳐 세고, 덮인 수가 가장 적은 각도 중
+    # theta0 에 가장 가까운 곳을 고른다. 반환: (각도, 그 자리에서 겹치는 이웃 수)
+    reach = half_i + half
+    near = np.abs(r - rho) < reach
+    if not near.any(): return theta0, 0
+    r, reach = r[near], reach[near]
+    phi = np.arccos(np.clip((rho**2 + r**2 - reach**2) / (2 * rho * r), -1, 1))
+    center = np.mod(theta[near] - theta0 + math.pi, 2 * math.pi) - math.pi
+    # 한 바퀴 앞뒤로 복제해 감김 처리, 구간 경계 이벤트를 정렬해 누적합 = 구간별 덮인 수
+    center = np.concatenate((center - 2 * math.pi, center, center + 2 * math.pi))
+    phi = np.tile(phi, 3)
+    events = np.concatenate((center - phi, center + phi))
+    o = np.argsort(events, kind="stable")
+    depth = np.cumsum(np.where(o < len(center), 1, -1))
+    a = np.maximum(events[o], -math.pi)
+    b = np.minimum(np.append(events[o][1:], np.inf), math.pi)
+    ok = np.flatnonzero(a < b)
+    point = np.clip(0.0, a[ok], b[ok])
+    k = np.lexsort((np.abs(point), depth[ok]))[0]
+    return theta0 + point[k], int(depth[ok][k])
+
+def _slot_positions(d, angles, sizes, padding=2.25, radial_tol=0.5, radial_steps=2):
+    # 거리 오름차순으로 한 점씩 배치: 이미 놓인 이웃 중 옆 링까지(|r_j - d| < half_i + half_j) 막는 각도 섹터를 피해
+    # 해시 각도에 가장 가까운 빈 각도로 옮긴다. 빈 곳이 없으면 반지름을 radial_tol 안에서만 바꿔 보고,
+    # 그래도 없으면 겹치는 이웃이 가장 적은 자리에 두고 나머지는 힘 배치에 맡긴다.
+    d = np.asarray(d, dtype=float)
+    angles = np.asarray(angles, dtype=float)
+    n = len(d)
+    r, theta = d.copy(), angles.copy()
+    if n <= 1: return r * np.cos(theta), r * np.sin(theta)
+    half = _marker_radius(sizes) * padding
+    offsets = np.linspace(0, radial_tol, radial_steps + 1)[1:]
+    shifts = np.concatenate(([0.0], np.ravel(np.column_stack((offsets, -offsets)))))
+
+    order = np.lexsort((-half, d))
+    for k, i in enumerate(order):
+        placed = order[:k]
+        best = None
+        for dr in shifts:
+            rho = max(d[i] + dr, half[i])
+            a, depth = _best_angle(rho, angles[i], half[i], r[placed], theta[placed], half[placed])
+            if best is None or depth < best[2]: best = (rho, a, depth)
+            if depth == 0: break
+        r[i], theta[i] = best[0], best[1]
+    return r * np.cos(theta), r * np.sin(theta)
+
+def _separate_points(x, y, sizes, target_r=None, iters=170, padding=2.25, repel_strength=0.065, pull_strength=0.02, patience=20):
     x = np.array(x, dtype=float)
     y = np.array(y, dtype=float)
-    sizes = np.array(sizes, dtype=float)
-    r0 = np.sqrt(x**2 + y**2) + 1e-9
-    rad = 0.10 + 0.012 * sizes
+    # 끌어당김 목표는 실제 트렌드 거리 (없으면 현재 반지름)
+    r0 = (np.asarray(target_r, dtype=float) if target_r is not None else np.sqrt(x**2 + y**2)) + 1e-9
+    rad = _marker_radius(sizes)
     n = len(x)
-    if n <= 1: return x.tolist(), y.tolist()
+    if n <= 1: return x, y
 
+    iu, ju = np.triu_indices(n, 1)
+    min_dist = (rad[iu] + rad[ju]) * padding
+    # 겹치는 쌍이 가장 적었던 배치를 기억, 겹침이 없거나 patience 동안 줄지 않으면 조기 종료
+    best, best_hits, stall = (x.copy(), y.copy()), None, 0
     for _ in range(iters):
-        dx = np.zeros(n)
-        dy = np.zeros(n)
-        for i in range(n):
-            for j in range(i + 1, n):
-                vx = x[i] - x[j]
-                vy = y[i] - y[j]
-                dist = math.hypot(vx, vy) + 1e-9
-                min_dist = (rad[i] + rad[j]) * padding
-                if dist < min_dist:
-                    overlap = (min_dist - dist) / min_dist
-                    push = repel_strength * overlap
-                    ux, uy = vx / dist, vy / dist
-                    dx[i] += ux * push
-                    dy[i] += uy * push
-                    dx[j] -= ux * push
-                    dy[j] -= uy * push
-        x += dx
-        y += dy
+        vx = x[iu] - x[ju]
+        vy = y[iu] - y[ju]
+        dist = np.hypot(vx, vy) + 1e-9
+        hit = dist < min_dist
+        n_hits = int(hit.sum())
+        if best_hits is None or n_hits < best_hits:
+            best, best_hits, stall = (x.copy(), y.copy()), n_hits, 0
+        else:
+            stall += 1
+        if not n_hits or stall >= patience: break
+        push = repel_strength * (min_dist[hit] - dist[hit]) / min_dist[hit]
+        px = vx[hit] / dist[hit] * push
+        py = vy[hit] / dist[hit] * push
+        x += np.bincount(iu[hit], px, n) - np.bincount(ju[hit], px, n)
+        y += np.bincount(iu[hit], py, n) - np.bincount(ju[hit], py, n)
         r = np.sqrt(x**2 + y**2) + 1e-9
         scale = (r0 / r)
         x = x * (1 - pull_strength) + (x * scale) * pull_strength
         y = y * (1 - pull_strength) + (y * scale) * pull_strength
-    return x.tolist(), y.tolist()
+    return best
 
 def _add_center_marker_only(fig, row, col, center_label):
     fig.add_trace(go.Scatter(x=[0], y=[0], mode="markers", marker=dict(symbol="circle", size=52, color="black", opacity=0.05, line=dict(width=0)), hoverinfo="skip", showlegend=False), row=row, col=col)
     fig.add_trace(go.Scatter(x=[0], y=[0], mode="markers", marker=dict(symbol="star", size=22, color="black", line=dict(width=1, color="white")), hoverinfo="text", hovertext=f"<b>{center_label} CENTER</b><br>Reference point", showlegend=False), row=row, col=col)
 
-def generate_interactive_map():
-    print("\n[3/3] 🎨 인터랙티브 웹 맵 생성 중...")
-
+def _lod_keep(counts, d, first_seen, budget, must_keep, ring_width=LOD_RING_WIDTH):
+    keep = np.zeros(len(d), dtype=bool)
+    if budget is None or len(d) <= budget:
+        keep[:] = True
+        return keep
+    # 득표 많은 순 → 거리 가까운 순 → 설문 등장 순, Top Trends 는 항상 개별 마커
+    rank = np.lexsort((first_seen, d, -counts))
+    keep[rank[:budget]] = True
+    keep[must_keep] = True
+    # 링에 한 곳만 남으면 "+1" 클러스터 대신 개별 마커로
+    tail = np.flatnonzero(~keep)
+    _, inv, n = np.unique(np.floor(d[tail] / ring_width).astype(int), return_inverse=True, return_counts=True)
+    keep[tail[n[inv] == 1]] = True
+    return keep
+
+def _cluster_marker_size(n_places, base: float = 14.0, scale: float = 4.0, max_size: float = LOD_CLUSTER_MAX_SIZE):
+    # 클러스터는 장소 수의 로그로만 키우고 개별 마커보다 커지지 않게 제한
+    return np.minimum(base + scale * np.log2(np.maximum(np.asarray(n_places, dtype=float), 1)), max_size)
+
+def _cluster_tail(names, counts, d, key, ring_width=LOD_RING_WIDTH, hover_limit=LOD_HOVER_LIMIT):
+    out = {"distance": [], "angle": [], "size": [], "label": [], "hover": [], "detail": []}
+    ring = np.floor(d / ring_width).astype(int)
+    for k in np.unique(ring):
+        m = np.flatnonzero(ring == k)
+        m = m[np.lexsort((d[m], -counts[m]))]
+        # 클릭 시 innerHTML 로 들어가므로 응답자 입력 장소명은 이스케이프
+        lines = [f"• {html.escape(str(names[i]))} · {counts[i]}명" for i in m]
+        shown = lines[:hover_limit]
+        if len(lines) > hover_limit: shown.append(f"…and {len(lines) - hover_limit} more (click to expand)")
+        header = f"<b>+{len(m)} places</b><br><span style='color:#6b7280'>Votes</span> · {int(counts[m].sum())}명<br><span style='color:#6b7280'>Distance</span> · {k * ring_width:.0f}–{(k + 1) * ring_width:.0f}<br><br>"
+
+        out["distance"].append(float(d[m].mean()))
+        out["angle"].append(_stable_angle(f"{key}#ring{k}"))
+        out["size"].append(float(_cluster_marker_size(len(m))))
+        out["label"].append(f"+{len(m)}")
+        out["hover"].append(header + "<br>".join(shown))
+        out["detail"].append(header + "<br>".join(lines))
+    return {k: np.asarray(v, dtype=float if k in ("distance", "angle", "size") else object) for k, v in out.items()}
+
+def load_segments(as_of=None, compare_to=None):
+    # as_of / compare_to 가 있으면 place_volumes.csv 대신 검색량 이력에서 해당 시점 값을 사용
     try:
         df = pd.read_csv(CLEAN_FILE)
-        volumes_df = pd.read_csv(VOLUME_FILE)
-        volumes = volumes_df.set_index("place")["search_volume"].to_dict()
+        volumes_df = pd.read_csv(VOLUME_FILE) if as_of is None else VolumeHistory(HISTORY_DIR).as_of(as_of, QUERY_CONFIG)
     except FileNotFoundError:
         print("❌ CSV 파일 없음.")
-        return
+        return None
+
+    table = PlaceTable()
+    segments = aggregate_segments(df, SEGMENT_CONFIGS, table)
+    volumes = volume_array(table, volumes_df)
+    for seg in segments:
+        seg["distances"] = safe_distance(volumes, seg["counts"])
+    data = {"table": table, "volumes": volumes, "segments": segments}
+    if compare_to is not None:
+        data["baseline_volumes"] = volume_array(table, VolumeHistory(HISTORY_DIR).as_of(compare_to, QUERY_CONFIG))
+        data["compare_to"] = compare_to
+    return data
+
+def _hover_text(place, count, vol, d, reasons, baseline=None, since=None):
+    trend = ""
+    if baseline is not None and baseline > 0:
+        trend = f"<br><span style='color:#6b7280'>Trend</span> · {(vol - baseline) / baseline:+.1%} since {since}"
+    unique_reasons = list(dict.fromkeys(reasons))
+    display = unique_reasons[:6]
+    if len(unique_reasons) > 6: display.append("…and more")
+    reasons_html = "<br>".join([f"• {t}" for t in display]) if display else "• (no reason provided)"
+    return f"<b>{place}</b><br><span style='color:#6b7280'>Votes</span> · {count}명<br><span style='color:#6b7280'>Search volume</span> · {vol:,.0f}{trend}<br><span style='color:#6b7280'>Distance</span> · {d:.2f}<br><br><b>Reasons</b><br>{reasons_html}"
 
-    configs = [
-        {"title": "Seoul · Male",   "gender": "남성", "pairs": [(7, 8), (9, 10)], "row": 1, "col": 1, "color": "#1f77b4", "center_label": "SEOUL"},
-        {"title": "Seoul · Female", "gender": "여성", "pairs": [(7, 8), (9, 10)], "row": 1, "col": 2, "color": "#ff7f0e", "center_label": "SEOUL"},
-        {"title": "Tokyo · Male",   "gender": "남성", "pairs": [(3, 4), (5, 6)],  "row": 2, "col": 1, "color": "#2ca02c", "center_label": "TOKYO"},
-        {"title": "Tokyo · Female", "gender": "여성", "pairs": [(3, 4), (5, 6)],  "row": 2, "col": 2, "color": "#d62728", "center_label": "TOKYO"},
-    ]
+# ==========================================
+# [STEP 3] 순위 안정성 (부트스트랩)
+# ==========================================
+def run_bootstrap(data=None):
+    print(f"\n[3/6] 🎲 순위 안정성 부트스트랩 ({BOOTSTRAP_SAMPLES:,}회) 시작...")
+    if data is None:
+        data = load_segments()
+        if data is None: return None
+    start = time.time()
+    stability = bootstrap_rank_stability(data["table"], data["volumes"], data["segments"], n_samples=BOOTSTRAP_SAMPLES, n_jobs=BOOTSTRAP_JOBS)
+    stability.to_csv(BOOTSTRAP_FILE, index=False, encoding='utf-8-sig')
+    data["bootstrap"] = stability
+    print(f"   ✅ 완료 ({time.time() - start:.2f}초). '{BOOTSTRAP_FILE}' 저장됨.")
+    return stability
 
-    fig = make_subplots(rows=2, cols=2, subplot_titles=[c["title"] for c in configs], horizontal_spacing=0.08, vertical_spacing=0.10)
+# ==========================================
+# [STEP 4] 인터랙티브 맵
+# ==========================================
+def generate_interactive_map(data=None, output_file=OUTPUT_HTML):
+    print("\n[4/6] 🎨 인터랙티브 웹 맵 생성 중...")
+
+    if data is None:
+        data = load_segments()
+        if data is None: return
+    table, volumes = data["table"], data["volumes"]
+    baseline = data.get("baseline_volumes", np.full(len(table), np.nan))
+    names = np.array(table.names, dtype=object)
+    angles_all = np.array([_stable_angle(p) for p in table.names], dtype=float)
+
+    fig = make_subplots(rows=2, cols=2, subplot_titles=[c["title"] for c in SEGMENT_CONFIGS], horizontal_spacing=0.08, vertical_spacing=0.10)
     all_x, all_y = [], []
-    gender_col_idx = 2
     top_picks_per_subplot = []
 
-    for cfg in configs:
-        sub_df = df[df.iloc[:, gender_col_idx].astype(str).str.contains(cfg["gender"], na=False)]
-        place_data = {}
-        for place_idx, reason_idx in cfg["pairs"]:
-            for p, r in zip(sub_df.iloc[:, place_idx], sub_df.iloc[:, reason_idx]):
-                if pd.isna(p): continue
-                p = str(p).strip()
-                if not p: continue
-                if p not in place_data: place_data[p] = {"count": 0, "reasons": []}
-                place_data[p]["count"] += 1
-                if pd.notna(r) and str(r).strip(): place_data[p]["reasons"].append(str(r).strip())
-
-        x_vals, y_vals, sizes, hover_texts, labels = [], [], [], [], []
-        items_with_distance = []
-
-        for place, info in place_data.items():
-            vol = volumes.get(place, None)
-            count = info["count"]
-            
-            d = _safe_distance(vol, count)
-            if d is None: continue
-            
-            items_with_distance.append({"place": place, "distance": d})
-            
-            angle = _stable_angle(place)
-            x, y = d * math.cos(angle), d * math.sin(angle)
-            size = _compute_marker_size(count)
-            
-            unique_reasons = list(dict.fromkeys(info["reasons"]))
-            display = unique_reasons[:6]
-            if len(unique_reasons) > 6: display.append("…and more")
-            reasons_html = "<br>".join([f"• {t}" for t in display]) if display else "• (no reason provided)"
-            
-            hover_texts.append(f"<b>{place}</b><br><span style='color:#6b7280'>Votes</span> · {count}명<br><span style='color:#6b7280'>Search volume</span> · {vol:,}<br><span style='color:#6b7280'>Distance</span> · {d:.2f}<br><br><b>Reasons</b><br>{reasons_html}")
-            x_vals.append(x); y_vals.append(y); sizes.append(size); labels.append(place)
+    for seg in data["segments"]:
+        cfg, counts, dist = seg["cfg"], seg["counts"], seg["distances"]
+
+        # 투표된 장소 중 거리 계산이 가능한 것만 (ID 배열)
+        ids = np.flatnonzero((counts > 0) & ~np.isnan(dist))
+        d = dist[ids]
 
-        # 거리 기준 오름차순 정렬
-        items_with_distance.sort(key=lambda x: x["distance"])
+        # 거리 기준 오름차순 정렬 (동점은 설문 등장 순서)
+        first_seen = first_appearance(seg["picks"], len(table))[ids]
+        order = np.lexsort((first_seen, d))
+        items_with_distance = [{"place": names[ids[i]], "distance": float(d[i])} for i in order]
 
         # [수정] 공동 2위 포함 로직
         final_top_items = []
@@ -252,24 +377,46 @@ def generate_interactive_map():
                         break
 
         top_picks_per_subplot.append({
+            "key": cfg["key"],
             "row": cfg["row"],
             "col": cfg["col"],
             "top_items": final_top_items
         })
 
-        x_vals, y_vals = _separate_points(x_vals, y_vals, sizes)
-        all_x += x_vals; all_y += y_vals
+        # LOD: 상위 장소만 개별 마커, 나머지 롱테일은 링별 클러스터 마커로 합침
+        keep = _lod_keep(counts[ids], d, first_seen, cfg.get("max_points", LOD_MAX_POINTS), order[:len(final_top_items)])
+        kept_ids, tail = ids[keep], ~keep
+        sizes = _compute_marker_size(counts[kept_ids])
+        labels = names[kept_ids].tolist()
+        hover_texts = [_hover_text(names[i], counts[i], volumes[i], dist[i], seg["reasons"].get(i, []), baseline[i], data.get("compare_to")) for i in kept_ids]
+        clusters = _cluster_tail(names[ids[tail]], counts[ids[tail]], d[tail], cfg["key"])
+
+        n_kept = len(kept_ids)
+        marker_sizes = np.concatenate((sizes, clusters["size"]))
+        marker_d = np.concatenate((d[keep], clusters["distance"]))
+        xs, ys = _slot_positions(marker_d, np.concatenate((angles_all[kept_ids], clusters["angle"])), marker_sizes)
+        xs, ys = _separate_points(xs, ys, marker_sizes, target_r=marker_d)
+        all_x.append(xs); all_y.append(ys)
+        x_vals, y_vals = xs[:n_kept], ys[:n_kept]
 
         fig.add_trace(go.Scatter(x=x_vals, y=y_vals, mode="markers+text", text=labels, textposition="top center", textfont=dict(size=11), marker=dict(size=sizes, color=cfg["color"], opacity=0.82, line=dict(width=1, color="rgba(255,255,255,0.95)")), hoverinfo="text", hovertext=hover_texts, showlegend=False), row=cfg["row"], col=cfg["col"])
+        if len(clusters["label"]):
+            fig.add_trace(go.Scatter(x=xs[n_kept:], y=ys[n_kept:], mode="markers+text", text=clusters["label"], textposition="middle center", textfont=dict(size=11, color="#374151"), marker=dict(size=clusters["size"], color=cfg["color"], opacity=0.28, line=dict(width=1, color=cfg["color"])), hoverinfo="text", hovertext=clusters["hover"], customdata=clusters["detail"], showlegend=False), row=cfg["row"], col=cfg["col"])
         _add_center_marker_only(fig, cfg["row"], cfg["col"], cfg["center_label"])
 
-    r = max(10, max(max(abs(min(all_x or [0])), abs(max(all_x or [0]))), max(abs(min(all_y or [0])), abs(max(all_y or [0])))) * 1.25)
+    all_xy = np.abs(np.concatenate(all_x + all_y)) if all_x else np.zeros(0)
+    r = max(10, (all_xy.max() if all_xy.size else 0) * 1.25)
     
     # [수정] Top Trends 박스 표기 개선 (공동 순위 반영)
     for pick in top_picks_per_subplot:
         if not pick["top_items"]: continue
         
         text_lines = ["<b>🔥 Top Trends</b>"]
+
+        # 부트스트랩 결과가 있으면 재표본에서 같은 순위권에 든 비율을 함께 표시
+        stability = data.get("bootstrap")
+        if stability is not None and len(stability):
+            stability = stability[stability["segment"] == pick["key"]].set_index("place")
         
         # 1위의 거리 (기준점)
         best_dist = pick["top_items"][0]["distance"]
@@ -280,7 +427,11 @@ def generate_interactive_map():
                 medal = "🥇"
             else:
                 medal = "🥈"
-            text_lines.append(f"{medal} {item['place']}")
+            line = f"{medal} {item['place']}"
+            if stability is not None and item["place"] in stability.index:
+                p = stability.at[item["place"], "p_top1" if medal == "🥇" else "p_top2"]
+                line += f" <span style='color:#6b7280'>({p:.0%})</span>"
+            text_lines.append(line)
         
         fig.add_annotation(
             text="<br>".join(text_lines),
@@ -299,18 +450,70 @@ def generate_interactive_map():
     fig.update_layout(shapes=[], paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font=dict(family="system-ui, sans-serif", size=12, color="#111827"), margin=dict(l=18, r=18, t=64, b=18), showlegend=False, height=860, width=1120, dragmode=False)
     fig.update_xaxes(visible=False, range=[-r, r]); fig.update_yaxes(visible=False, range=[-r, r])
 
-    plot_div = fig.to_html(full_html=False, include_plotlyjs="cdn", config={"dragmode": False, "displaylogo": False, "modeBarButtonsToRemove": ["zoom2d", "pan2d", "select2d", "lasso2d", "zoomIn2d", "zoomOut2d", "autoScale2d", "resetScale2d"]})
-    html = f"""<!doctype html><html lang="ko"><head><meta charset="utf-8"/><meta name="viewport" content="width=device-width,initial-scale=1"/><title>Trend-KNN</title><style>:root{{--bg:#ffffff;--card:#ffffff;--text:#111827;--muted:#6b7280;--border:rgba(17,24,39,0.08);--shadow:0 10px 24px rgba(17,24,39,0.06);--radius:18px;}}body{{margin:0;background:var(--bg);color:var(--text);font-family:system-ui,-apple-system,sans-serif;}}.wrap{{max-width:1200px;margin:0 auto;padding:30px 18px 44px;}}.header{{max-width:860px;margin-bottom:16px;}}.title{{font-size:26px;font-weight:760;margin:0 0 8px;}}.subtitle{{margin:0;color:var(--muted);font-size:14px;line-height:1.6;}}.card{{background:var(--card);border:1px solid var(--border);border-radius:var(--radius);box-shadow:var(--shadow);padding:14px 14px 10px;}}.footer{{margin-top:10px;color:var(--muted);font-size:12px;}}.divider{{height:1px;background:var(--border);margin:10px 0 0;}}</style></head><body><div class="wrap"><div class="header"><h1 class="title">Trend-KNN Interactive Map</h1><p class="subtitle">Dot size represents <b>survey popularity</b>. Distance from center represents <b>trend strength</b> (Search Volume).<br>Hover a dot to see reasons.</p></div><div class="card">{plot_div}<div class="divider"></div><div class="footer">Center star is the reference point (SEOUL/TOKYO). Larger circles mean more mentions.</div></div></div></body></html>"""
+    plot_div = fig.to_html(full_html=False, include_plotlyjs="cdn", div_id="trend-map", config={"dragmode": False, "displaylogo": False, "modeBarButtonsToRemove": ["zoom2d", "pan2d", "select2d", "lasso2d", "zoomIn2d", "zoomOut2d", "autoScale2d", "resetScale2d"]})
+    page_html = f"""<!doctype html><html lang="ko"><head><meta charset="utf-8"/><meta name="viewport" content="width=device-width,initial-scale=1"/><title>Trend-KNN</title><style>:root{{--bg:#ffffff;--card:#ffffff;--text:#111827;--muted:#6b7280;--border:rgba(17,24,39,0.08);--shadow:0 10px 24px rgba(17,24,39,0.06);--radius:18px;}}body{{margin:0;background:var(--bg);color:var(--text);font-family:system-ui,-apple-system,sans-serif;}}.wrap{{max-width:1200px;margin:0 auto;padding:30px 18px 44px;}}.header{{max-width:860px;margin-bottom:16px;}}.title{{font-size:26px;font-weight:760;margin:0 0 8px;}}.subtitle{{margin:0;color:var(--muted);font-size:14px;line-height:1.6;}}.card{{background:var(--card);border:1px solid var(--border);border-radius:var(--radius);box-shadow:var(--shadow);padding:14px 14px 10px;}}.footer{{margin-top:10px;color:var(--muted);font-size:12px;}}.divider{{height:1px;background:var(--border);margin:10px 0 0;}}.detail{{display:none;margin-top:10px;padding:10px 12px;border:1px solid var(--border);border-radius:12px;font-size:12px;line-height:1.6;max-height:260px;overflow:auto;}}</style></head><body><div class="wrap"><div class="header"><h1 class="title">Trend-KNN Interactive Map</h1><p class="subtitle">Dot size represents <b>survey popularity</b>. Distance from center represents <b>trend strength</b> (Search Volume).<br>Hover a dot to see reasons. Faded <b>+N</b> circles group long-tail places; click one to list them.</p></div><div class="card">{plot_div}<div class="divider"></div><div class="footer">Center star is the reference point (SEOUL/TOKYO). Larger circles mean more mentions.</div><div id="cluster-detail" class="detail"></div></div></div><script>window.addEventListener("load",function(){{var gd=document.getElementById("trend-map"),el=document.getElementById("cluster-detail");gd.on("plotly_click",function(e){{var p=e.points[0];if(!p||!p.customdata)return;el.innerHTML=p.customdata;el.style.display="block";}});}});</script></body></html>"""
     
-    with open(OUTPUT_HTML, "w", encoding="utf-8") as f: f.write(html)
-    print(f"   ✅ 완성되었습니다! '{OUTPUT_HTML}' 파일을 확인하세요.")
+    with open(output_file, "w", encoding="utf-8") as f: f.write(page_html)
+    print(f"   ✅ 완성되었습니다! '{output_file}' 파일을 확인하세요.")
+
+# ==========================================
+# [STEP 5] KNN 인덱스
+# ==========================================
+def build_knn_index(data=None):
+    print("\n[5/6] 🧭 Trend-KNN 인덱스 생성 중...")
+    if data is None:
+        data = load_segments()
+        if data is None: return None
+    index = TrendIndex.build(data["table"], data["volumes"], data["segments"])
+    index.save(KNN_INDEX_FILE)
+    print(f"   ✅ {len(index)}개 (세그먼트, 장소) 인덱싱 완료! '{KNN_INDEX_FILE}' 저장됨.")
+    return index
+
+# ==========================================
+# [STEP 6] 세그먼트 비교 (남/여, 서울/도쿄)
+# ==========================================
+def compare_segments(data=None):
+    print("\n[6/6] ⚖️ 세그먼트 간 선호 비교 중...")
+    if data is None:
+        data = load_segments()
+        if data is None: return None
+    keys = [seg["cfg"]["key"] for seg in data["segments"]]
+    matrix = build_place_segment_matrix(data["segments"], len(data["table"]))
+    save_matrix(MATRIX_FILE, matrix, data["table"].names, keys)
+    pairs = similarity_pairs(matrix, keys)
+    pairs.to_csv(SIMILARITY_FILE, index=False, encoding='utf-8-sig')
+    for row in pairs.itertuples():
+        print(f"   - {row.segment_a} vs {row.segment_b}: cosine {row.cosine:.2f} · jaccard {row.jaccard:.2f} · spearman {row.spearman:.2f}")
+    print(f"   ✅ '{MATRIX_FILE}', '{SIMILARITY_FILE}' 저장됨.")
+    return pairs
+
+def render_history(as_of=None, compare_to=None, output_file=OUTPUT_HTML):
+    # 이력 저장소 기준 과거 시점 맵 / 두 시점 간 트렌드 변화 맵
+    print(f"🕰️ [Trend-KNN] 검색량 이력 기준 맵 생성 (as of {as_of or 'latest'}, compare to {compare_to or '-'})")
+    data = load_segments(as_of=as_of or int(time.time()), compare_to=compare_to)
+    if data is None: return
+    generate_interactive_map(data, output_file)
 
 def main():
+    parser = argparse.ArgumentParser(description="Trend-KNN pipeline")
+    parser.add_argument("--as-of", help="render the map from volume history as of this date (e.g. 2026-05-01)")
+    parser.add_argument("--compare-to", help="show search-volume change since this date in hover text")
+    parser.add_argument("--output", default=OUTPUT_HTML)
+    args = parser.parse_args()
+    if args.as_of or args.compare_to:
+        render_history(args.as_of, args.compare_to, args.output)
+        return
+
     print("🚀 [Trend-KNN] 전체 파이프라인 실행 시작...")
     start_time = time.time()
     process_survey_data()
     fetch_search_volumes()
-    generate_interactive_map()
+    data = load_segments()
+    if data is None: return
+    run_bootstrap(data)
+    generate_interactive_map(data, args.output)
+    build_knn_index(data)
+    compare_segments(data)
     end_time = time.time()
     print(f"\n🎉 모든 작업 완료! (소요 시간: {end_time - start_time:.2f}초)")
 
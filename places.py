@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 장소 ID 인터닝 + 세그먼트별 배열 집계
+# ==========================================
+# 장소 이름은 PlaceTable 에서 한 번만 정수 ID 로 바뀌고,
+# 이후 단계(득표수, 검색량, 거리, 좌표)는 모두 ID 로 인덱싱되는 NumPy 배열을 사용한다.
+
+
+class PlaceTable:
+    def __init__(self, names=()):
+        self.names = []
+        self._ids = {}
+        for name in names:
+            self.intern(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def intern(self, name: str) -> int:
+        place_id = self._ids.get(name)
+        if place_id is None:
+            place_id = len(self.names)
+            self._ids[name] = place_id
+            self.names.append(name)
+        return place_id
+
+    def lookup(self, name: str) -> int:
+        return self._ids.get(name, -1)
+
+    def name(self, place_id: int) -> str:
+        return self.names[place_id]
+
+    def _encode(self, values, add: bool) -> np.ndarray:
+        s = pd.Series(values, dtype=object)
+        ids = np.full(len(s), -1, dtype=np.int64)
+        mask = s.notna().to_numpy()
+        if not mask.any():
+            return ids
+        cleaned = s[mask].astype(str).str.strip()
+        codes, uniques = pd.factorize(cleaned)
+        convert = self.intern if add else self.lookup
+        mapping = np.array([convert(u) if u else -1 for u in uniques], dtype=np.int64)
+        ids[mask] = mapping[codes]
+        return ids
+
+    def intern_many(self, values) -> np.ndarray:
+        # NaN / 빈 문자열은 -1
+        return self._encode(values, add=True)
+
+    def lookup_many(self, values) -> np.ndarray:
+        return self._encode(values, add=False)
+
+
+def volume_array(table: PlaceTable, volumes_df: pd.DataFrame) -> np.ndarray:
+    vols = np.full(len(table), np.nan)
+    ids = table.lookup_many(volumes_df["place"])
+    v = pd.to_numeric(volumes_df["search_volume"], errors="coerce").to_numpy(dtype=float)
+    ok = ids >= 0
+    vols[ids[ok]] = v[ok]
+    return vols
+
+
+def safe_distance(volume, count, k: float = 30.0, min_d: float = 2.0, max_d: float = 25.0):
+    # Distance = Base(검색량) - Vote-First Bonus, 배열 입력 지원, 계산 불가(검색량 없음/1 이하)는 NaN
+    v = np.asarray(volume, dtype=float)
+    c = np.asarray(count, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = np.log10(v)
+        base_distance = k / denom
+    valid = (v > 1) & (denom > 0)
+
+    vote_bonus = (c - 1) * 1.5
+    final_distance = np.where(valid, base_distance - vote_bonus, np.nan)
+    return np.clip(final_distance, min_d, max_d)
+
+
+def aggregate_segments(df: pd.DataFrame, configs, table: PlaceTable, gender_col_idx: int = 2):
+    segments = []
+    for cfg in configs:
+        sub_df = df[df.iloc[:, gender_col_idx].astype(str).str.contains(cfg["gender"], na=False)]
+        picks, reasons = [], {}
+        for place_idx, reason_idx in cfg["pairs"]:
+            ids = table.intern_many(sub_df.iloc[:, place_idx])
+            picks.append(ids)
+            for place_id, r in zip(ids, sub_df.iloc[:, reason_idx]):
+                if place_id < 0 or pd.isna(r):
+                    continue
+                r = str(r).strip()
+                if r:
+                    reasons.setdefault(int(place_id), []).append(r)
+        # picks: (응답자 수, 추천 칸 수), 빈 칸은 -1
+        picks = np.column_stack(picks) if picks else np.empty((len(sub_df), 0), dtype=np.int64)
+        segments.append({"cfg": cfg, "picks": picks, "reasons": reasons})
+
+    # 모든 세그먼트 인터닝이 끝난 뒤 같은 길이로 집계
+    for seg in segments:
+        seg["counts"] = count_votes(seg["picks"], len(table))
+    return segments
+
+
+def count_votes(picks: np.ndarray, n_places: int) -> np.ndarray:
+    ids = picks.ravel()
+    return np.bincount(ids[ids >= 0], minlength=n_places)
+
+
+def first_appearance(picks: np.ndarray, n_places: int) -> np.ndarray:
+    # 추천 칸 순서(열 우선)로 처음 등장한 위치, 미등장은 len
+    ids = picks.ravel(order="F")
+    first = np.full(n_places, len(ids), dtype=np.int64)
+    valid = np.flatnonzero(ids >= 0)
+    np.minimum.at(first, ids[valid], valid)
+    return first
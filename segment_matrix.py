@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# ==========================================
+# 장소 × 세그먼트 희소 득표 행렬 + 세그먼트 쌍 비교 지표
+# ==========================================
+# 행 = PlaceTable 의 장소 ID, 열 = SEGMENT_CONFIGS 의 key.
+# 모든 지표는 S×S 행렬 연산 한 번으로 계산한다 (세그먼트 쌍 루프 없음).
+
+
+def build_place_segment_matrix(segments, n_places: int) -> sp.csr_matrix:
+    rows, cols = [], []
+    for s, seg in enumerate(segments):
+        ids = seg["picks"].ravel()
+        ids = ids[ids >= 0]
+        rows.append(ids)
+        cols.append(np.full(len(ids), s, dtype=np.int64))
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+    # 중복 (장소, 세그먼트) 는 tocsr 에서 합산 → 득표수
+    data = np.ones(len(rows), dtype=np.int64)
+    return sp.coo_matrix((data, (rows, cols)), shape=(n_places, len(segments))).tocsr()
+
+
+def cosine_similarity(matrix) -> np.ndarray:
+    x = sp.csr_matrix(matrix, dtype=float)
+    gram = (x.T @ x).toarray()
+    norms = np.sqrt(np.diag(gram))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return gram / np.outer(norms, norms)
+
+
+def _intersections(matrix):
+    b = sp.csr_matrix(matrix, dtype=float)
+    b.data = (b.data > 0).astype(float)
+    inter = (b.T @ b).toarray()
+    return inter, np.diag(inter)
+
+
+def jaccard_similarity(matrix) -> np.ndarray:
+    inter, size = _intersections(matrix)
+    union = size[:, None] + size[None, :] - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return inter / union
+
+
+def overlap_coefficient(matrix) -> np.ndarray:
+    inter, size = _intersections(matrix)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return inter / np.minimum(size[:, None], size[None, :])
+
+
+def rank_correlation(matrix) -> np.ndarray:
+    # Spearman: 어느 세그먼트에서든 한 번이라도 언급된 장소만 대상으로, 동점은 평균 순위
+    x = sp.csr_matrix(matrix)
+    active = np.flatnonzero(x.getnnz(axis=1) > 0)
+    if len(active) < 2:
+        return np.full((x.shape[1], x.shape[1]), np.nan)
+    ranks = pd.DataFrame(x[active].toarray()).rank(axis=0, method="average").to_numpy()
+    ranks = ranks - ranks.mean(axis=0)
+    cov = ranks.T @ ranks
+    sd = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return cov / np.outer(sd, sd)
+
+
+METRICS = {
+    "cosine": cosine_similarity,
+    "jaccard": jaccard_similarity,
+    "overlap": overlap_coefficient,
+    "spearman": rank_correlation,
+}
+
+
+def segment_similarity(matrix, segment_keys) -> dict:
+    return {name: pd.DataFrame(fn(matrix), index=segment_keys, columns=segment_keys) for name, fn in METRICS.items()}
+
+
+def similarity_pairs(matrix, segment_keys) -> pd.DataFrame:
+    # 세그먼트 쌍(i < j)마다 한 행인 긴 형식 표
+    keys = np.asarray(segment_keys)
+    i, j = np.triu_indices(len(keys), 1)
+    out = pd.DataFrame({"segment_a": keys[i], "segment_b": keys[j]})
+    for name, fn in METRICS.items():
+        out[name] = fn(matrix)[i, j]
+    return out
+
+
+def save_matrix(path: str, matrix, names, segment_keys):
+    m = sp.csr_matrix(matrix)
+    np.savez_compressed(
+        path,
+        data=m.data, indices=m.indices, indptr=m.indptr, shape=np.asarray(m.shape),
+        names=np.asarray(names, dtype=str), segment_keys=np.asarray(segment_keys, dtype=str),
+    )
+
+
+def load_matrix(path: str):
+    with np.load(path, allow_pickle=False) as z:
+        m = sp.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"]))
+        return m, z["names"].tolist(), z["segment_keys"].tolist()
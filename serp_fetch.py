@@ -0,0 +1,47 @@
+import os
+import time
+
+from serpapi import GoogleSearch
+
+# ==========================================
+# SerpApi 검색량 조회 (main.py / fetch_trends.py 공용)
+# ==========================================
+# 429/5xx, 타임아웃, 깨진 응답 본문은 지수 백오프로 재시도한다.
+# SERPAPI_BACKEND 로 fake_serpapi.py 같은 로컬 서버를 가리킬 수 있다.
+
+SERPAPI_KEY = os.environ.get("SERPAPI_KEY", "api key")
+SERPAPI_BACKEND = os.environ.get("SERPAPI_BACKEND")  # 예: fake_serpapi.py 주소 (http://127.0.0.1:8765)
+FETCH_DELAY = float(os.environ.get("FETCH_DELAY", "0.5"))
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", "30"))
+FETCH_RETRIES = max(0, int(os.environ.get("FETCH_RETRIES", "3")))
+FETCH_BACKOFF = float(os.environ.get("FETCH_BACKOFF", "1.0"))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+QUERY_PARAMS = {"location": "Global", "hl": "en", "gl": "us"}
+
+
+def fetch_total_results(place):
+    params = {"q": place, **QUERY_PARAMS, "api_key": SERPAPI_KEY, "output": "json"}
+    last_error = None
+    for attempt in range(FETCH_RETRIES + 1):
+        if attempt:
+            time.sleep(FETCH_BACKOFF * 2 ** (attempt - 1))
+        search = GoogleSearch(dict(params))
+        if SERPAPI_BACKEND:
+            search.BACKEND = SERPAPI_BACKEND.rstrip("/")
+        search.timeout = FETCH_TIMEOUT
+        try:
+            response = search.get_response()
+        except Exception as e:  # 타임아웃 / 연결 오류 → 재시도
+            last_error = e
+            continue
+        if response.status_code in RETRY_STATUS:
+            last_error = RuntimeError(f"HTTP {response.status_code}")
+            continue
+        response.raise_for_status()
+        try:
+            results = response.json()
+        except ValueError as e:  # 깨진 응답 본문 → 재시도
+            last_error = e
+            continue
+        return results.get("search_information", {}).get("total_results", 0)
+    raise last_error
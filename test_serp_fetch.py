@@ -0,0 +1,58 @@
+import pytest
+
+import serp_fetch
+from fake_serpapi import FakeSerpApi, stable_total_results
+
+QUERIES = ["gangnam", "shibuya", "hongdae", "harajuku", "seongsu", "shimokitazawa", "itaewon", "nakameguro"]
+
+
+@pytest.fixture
+def fast_fetch(monkeypatch):
+    # 네트워크 없이 로컬 대역 서버로, 백오프 없이 재시도
+    monkeypatch.setattr(serp_fetch, "FETCH_BACKOFF", 0.0)
+    monkeypatch.setattr(serp_fetch, "FETCH_TIMEOUT", 0.5)
+    monkeypatch.setattr(serp_fetch, "FETCH_RETRIES", 20)
+
+    def use(fake):
+        monkeypatch.setattr(serp_fetch, "SERPAPI_BACKEND", fake.url)
+        return fake
+    return use
+
+
+def test_retries_rate_limits_and_malformed_bodies(fast_fetch):
+    with FakeSerpApi(latency_ms=0, rate_limit_rate=0.3, malformed_rate=0.3, seed=1) as fake:
+        fast_fetch(fake)
+        for q in QUERIES:
+            assert serp_fetch.fetch_total_results(q) == stable_total_results(q)
+    assert fake.stats["rate_limited"] > 0
+    assert fake.stats["malformed"] > 0
+    assert fake.stats["ok"] == len(QUERIES)
+    assert fake.stats["requests"] == len(QUERIES) + fake.stats["rate_limited"] + fake.stats["malformed"]
+
+
+def test_retries_timeouts(fast_fetch):
+    with FakeSerpApi(latency_ms=0, timeout_rate=0.4, hang_s=2.0, seed=3) as fake:
+        fast_fetch(fake)
+        for q in QUERIES[:4]:
+            assert serp_fetch.fetch_total_results(q) == stable_total_results(q)
+    assert fake.stats["timeouts"] > 0
+    assert fake.stats["ok"] == 4
+
+
+def test_too_many_failures_raise(fast_fetch, monkeypatch):
+    monkeypatch.setattr(serp_fetch, "FETCH_RETRIES", 2)
+    with FakeSerpApi(latency_ms=0, rate_limit_rate=1.0) as fake:
+        fast_fetch(fake)
+        with pytest.raises(RuntimeError, match="429"):
+            serp_fetch.fetch_total_results("gangnam")
+    assert fake.stats["requests"] == 3
+
+
+def test_sub_one_qps_bucket_lets_requests_through(fast_fetch, monkeypatch):
+    monkeypatch.setattr(serp_fetch, "FETCH_RETRIES", 0)
+    with FakeSerpApi(latency_ms=0, max_qps=0.5) as fake:
+        fast_fetch(fake)
+        assert serp_fetch.fetch_total_results("gangnam") == stable_total_results("gangnam")
+        with pytest.raises(RuntimeError, match="429"):
+            serp_fetch.fetch_total_results("shibuya")
+    assert fake.stats == {"requests": 2, "ok": 1, "rate_limited": 1, "timeouts": 0, "malformed": 0}
@@ -0,0 +1,170 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 검색량 이력 저장소 (append-only, 컬럼형)
+# ==========================================
+# volume_history/
+#   manifest.json      문자열 테이블(장소, 쿼리 설정), (장소, 설정) 키 테이블, 청크 목록 + 시간 범위
+#   chunk_000001.npz   key_id / observed_at(UTC epoch 초) / volume 컬럼, (key, 시각) 정렬
+#
+# 청크는 한 번 쓰면 바뀌지 않고 manifest 만 원자적으로 교체한다.
+# as-of 조회는 청크별 시간 범위(zone map)와 키별 최초 관측 시각으로
+# 필요한 청크만 최신 순으로 읽고, 모든 키가 확정되면 바로 멈춘다.
+
+
+def to_epoch(value, end_of_day: bool = True) -> int:
+    # "2026-05-01" 처럼 날짜만 주면 그날 끝(23:59:59 UTC)까지 포함
+    if value is None:
+        return int(time.time())
+    # 숫자는 epoch 초 (time.time() 같은 float 포함, pd.Timestamp 는 나노초로 해석하므로 먼저 처리)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    if end_of_day and isinstance(value, str) and len(value.strip()) == 10:
+        ts = ts + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+    return int(ts.timestamp())
+
+
+def config_key(params: dict) -> str:
+    return "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+
+class VolumeHistory:
+    def __init__(self, path: str):
+        self.path = path
+        self._manifest_path = os.path.join(path, "manifest.json")
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding="utf-8") as f:
+                m = json.load(f)
+        else:
+            m = {"places": [], "configs": [], "keys": [], "chunks": []}
+        self.places = m["places"]
+        self.configs = m["configs"]
+        self.chunks = m["chunks"]
+        keys = np.asarray(m["keys"], dtype=np.int64).reshape(-1, 3)
+        self._key_place, self._key_config, self._key_first_ts = keys[:, 0], keys[:, 1], keys[:, 2]
+        self._place_ids = {p: i for i, p in enumerate(self.places)}
+        self._config_ids = {c: i for i, c in enumerate(self.configs)}
+        self._key_ids = {(p, c): i for i, (p, c) in enumerate(zip(self._key_place.tolist(), self._key_config.tolist()))}
+
+    def __len__(self):
+        return sum(c["rows"] for c in self.chunks)
+
+    @property
+    def n_keys(self) -> int:
+        return len(self._key_place)
+
+    def _intern(self, table: list, ids: dict, value: str) -> int:
+        i = ids.get(value)
+        if i is None:
+            i = ids[value] = len(table)
+            table.append(value)
+        return i
+
+    def _save_manifest(self):
+        os.makedirs(self.path, exist_ok=True)
+        m = {
+            "places": self.places,
+            "configs": self.configs,
+            "keys": np.column_stack((self._key_place, self._key_config, self._key_first_ts)).tolist(),
+            "chunks": self.chunks,
+        }
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(m, f, ensure_ascii=False)
+        os.replace(tmp, self._manifest_path)
+
+    def append(self, volumes_df: pd.DataFrame, config: str, observed_at=None) -> int:
+        # volumes_df: place, search_volume (place_volumes.csv 형식), 선택적으로 observed_at 컬럼
+        df = volumes_df.dropna(subset=["place"])
+        vol = pd.to_numeric(df["search_volume"], errors="coerce").to_numpy(dtype=float)
+        if "observed_at" in df.columns:
+            ts = np.array([to_epoch(v, end_of_day=False) for v in df["observed_at"]], dtype=np.int64)
+        else:
+            ts = np.full(len(df), to_epoch(observed_at, end_of_day=False), dtype=np.int64)
+        ok = ~np.isnan(vol)
+        if not ok.any():
+            return 0
+
+        config_id = self._intern(self.configs, self._config_ids, config)
+        place_ids = [self._intern(self.places, self._place_ids, str(p).strip()) for p in df["place"]]
+        key_ids = np.empty(len(df), dtype=np.int64)
+        new_place, new_config, new_first = [], [], []
+        for n, place_id in enumerate(place_ids):
+            k = self._key_ids.get((place_id, config_id))
+            if k is None:
+                k = self._key_ids[(place_id, config_id)] = self.n_keys + len(new_place)
+                new_place.append(place_id); new_config.append(config_id); new_first.append(np.iinfo(np.int64).max)
+            key_ids[n] = k
+        self._key_place = np.concatenate((self._key_place, new_place)).astype(np.int64)
+        self._key_config = np.concatenate((self._key_config, new_config)).astype(np.int64)
+        self._key_first_ts = np.concatenate((self._key_first_ts, new_first)).astype(np.int64)
+
+        key_ids, ts, vol = key_ids[ok], ts[ok], vol[ok]
+        np.minimum.at(self._key_first_ts, key_ids, ts)
+        order = np.lexsort((ts, key_ids))
+        name = f"chunk_{len(self.chunks) + 1:06d}.npz"
+        os.makedirs(self.path, exist_ok=True)
+        np.savez(os.path.join(self.path, name), key=key_ids[order], observed_at=ts[order], volume=vol[order])
+        self.chunks.append({"file": name, "rows": int(len(order)), "min_ts": int(ts.min()), "max_ts": int(ts.max())})
+        self._save_manifest()
+        return int(len(order))
+
+    def _load_chunk(self, chunk):
+        with np.load(os.path.join(self.path, chunk["file"]), allow_pickle=False) as z:
+            return z["key"], z["observed_at"], z["volume"]
+
+    def _as_of_keys(self, t: int):
+        # 키별 t 이전 마지막 관측 (시각, 값), 관측이 없으면 시각 = -1
+        best_ts = np.full(self.n_keys, -1, dtype=np.int64)
+        best_vol = np.full(self.n_keys, np.nan)
+        needed = int((self._key_first_ts <= t).sum())
+        candidates = sorted((c for c in self.chunks if c["min_ts"] <= t), key=lambda c: c["max_ts"], reverse=True)
+        for chunk in candidates:
+            resolved = best_ts >= 0
+            # 모든 키가 확정됐고 남은 청크가 확정값보다 새로울 수 없으면 종료
+            if resolved.sum() == needed and needed and min(chunk["max_ts"], t) <= best_ts[resolved].min():
+                break
+            key, ts, vol = self._load_chunk(chunk)
+            mask = ts <= t
+            key, ts, vol = key[mask], ts[mask], vol[mask]
+            if not len(key):
+                continue
+            last = np.r_[key[1:] != key[:-1], True]
+            key, ts, vol = key[last], ts[last], vol[last]
+            newer = ts > best_ts[key]
+            best_ts[key[newer]] = ts[newer]
+            best_vol[key[newer]] = vol[newer]
+        return best_ts, best_vol
+
+    def as_of(self, when=None, config: str = None) -> pd.DataFrame:
+        # place_volumes.csv 와 같은 형식 (place, search_volume) + observed_at
+        best_ts, best_vol = self._as_of_keys(to_epoch(when))
+        keep = best_ts >= 0
+        if config is not None:
+            keep &= self._key_config == self._config_ids.get(config, -1)
+        idx = np.flatnonzero(keep)
+        return pd.DataFrame({
+            "place": [self.places[p] for p in self._key_place[idx]],
+            "config": [self.configs[c] for c in self._key_config[idx]],
+            "search_volume": best_vol[idx],
+            "observed_at": pd.to_datetime(best_ts[idx], unit="s", utc=True),
+        })
+
+    def latest(self, config: str = None) -> pd.DataFrame:
+        return self.as_of(np.iinfo(np.int64).max, config)
+
+    def delta(self, start, end=None, config: str = None) -> pd.DataFrame:
+        a = self.as_of(start, config).set_index(["place", "config"])
+        b = self.as_of(end, config).set_index(["place", "config"])
+        out = pd.DataFrame({"volume_start": a["search_volume"], "volume_end": b["search_volume"]})
+        out["delta"] = out["volume_end"] - out["volume_start"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["pct_change"] = out["delta"] / out["volume_start"]
+        return out.reset_index()